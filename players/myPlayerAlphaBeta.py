@@ -2,7 +2,9 @@
 
 from utils import Reversi
 from players.playerInterface import *
+from utils.TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
 import numpy as np 
+import time
 
 
 ''' 
@@ -42,6 +44,8 @@ Idée : créer un tableau de poids de manière à pondérer certains endroits :
     3.  Etre sur les côtés (or cases X et C) peut permettre de prendre des pions à l'adversaire : donc plus de poids ici. 
 
 '''
+# Valeur de la position du point de vue du joueur qui a le trait (blanc : c'est à Blanc de jouer),
+# comme l'attend negAlphaBeta
 def estimeFin(board, player, blanc):
     val = None
     if board.is_game_over():
@@ -53,7 +57,11 @@ def estimeFin(board, player, blanc):
         else:
             val = -1000 if blanc else 1000
     else:
-        val = heuristique(board, player)
+        # L'heuristique est calculée pour player : on la retourne si c'est à l'adversaire de jouer.
+        # Arrondie : MTDF a besoin de scores entiers pour ses fenêtres nulles
+        val = int(round(heuristique(board, player)))
+        if (player._mycolor == board._WHITE) != blanc:
+            val = -val
     return (val, None)
 
 '''
@@ -123,8 +131,8 @@ def piece_diff_heur(board, player):
 
 # Retourne la mobilité immédiate
 def mobility_heur(board, player):
-    my_moves = board.count_legal_moves(player)
-    opponent_moves = board.count_legal_moves(board._flip(player))
+    my_moves = board.count_legal_moves(player._mycolor)
+    opponent_moves = board.count_legal_moves(player._opponent)
     if my_moves > opponent_moves:
         m = (100 * my_moves)/(my_moves + opponent_moves)
     elif my_moves < opponent_moves:
@@ -240,23 +248,101 @@ def heuristique(board, player=None):
     return (10*p) + (100*cp) + (801.724 * c) + (382.026 * l) + (78.922 * m) + (74.396 * f) + (10 * d)
 
 
-def negAlphaBeta(b, color, alpha, beta, blanc, horizon=10):
+'''
+Tri des coups (critères 1, 4 et 5 du commentaire en tête de fichier) :
+    - le coup mémorisé dans la table de transposition d'abord,
+    - puis les coups meurtriers : les deux derniers coups ayant provoqué une coupure à la même profondeur (ply),
+    - puis les autres, par type de case (coins d'abord, cases C et X en dernier) et, à type égal, par
+      l'historique : chaque coupure ajoute horizon² au coup qui l'a provoquée.
+'''
+# Types de case, du plus prioritaire au moins prioritaire
+COIN = 2
+NORMALE = 1
+CASE_CX = 0
+
+def prioritesStatiques(boardsize):
+    priorites = [NORMALE] * (boardsize * boardsize)
+    dernier = boardsize - 1
+    for (x, y) in [(0, 0), (0, dernier), (dernier, 0), (dernier, dernier)]:
+        priorites[x * boardsize + y] = COIN
+        # dx, dy : direction vers l'intérieur du plateau
+        dx = 1 if x == 0 else -1
+        dy = 1 if y == 0 else -1
+        # Cases C (sur le bord, à côté du coin) et case X (en diagonale)
+        for (cx, cy) in [(x + dx, y), (x, y + dy), (x + dx, y + dy)]:
+            priorites[cx * boardsize + cy] = CASE_CX
+    return priorites
+
+
+class OrdreDesCoups:
+
+    def __init__(self, boardsize):
+        self._boardsize = boardsize
+        self._priorites = prioritesStatiques(boardsize)
+        # _killers[ply] : deux coups meurtriers, le plus récent en premier
+        self._killers = []
+        # _historique[joueur][x * boardsize + y]
+        self._historique = [None, [0] * (boardsize * boardsize), [0] * (boardsize * boardsize)]
+
+    # Au début de chaque coup : les coups meurtriers sont oubliés et l'historique vieillit
+    def nouvelleRecherche(self):
+        self._killers = []
+        for h in self._historique[1:]:
+            for i in range(len(h)):
+                h[i] //= 2
+
+    def trier(self, moves, coupMemoire=None, ply=0):
+        if len(moves) < 2:
+            return moves
+        (k0, k1) = self._killers[ply] if ply < len(self._killers) else (None, None)
+        n = self._boardsize
+        priorites = self._priorites
+        historique = self._historique
+        def cle(m):
+            if m == coupMemoire:
+                return (3, 0, 0)
+            if m == k0:
+                return (2, 0, 0)
+            if m == k1:
+                return (1, 0, 0)
+            i = m[1] * n + m[2]
+            return (0, priorites[i], historique[m[0]][i])
+        return sorted(moves, key=cle, reverse=True)
+
+    # Le coup m a provoqué une coupure à la profondeur ply, avec horizon coups restant à chercher
+    def coupure(self, m, ply, horizon):
+        if m[1] == -1:
+            return
+        while len(self._killers) <= ply:
+            self._killers.append((None, None))
+        (k0, _) = self._killers[ply]
+        if m != k0:
+            self._killers[ply] = (m, k0)
+        self._historique[m[0]][m[1] * self._boardsize + m[2]] += horizon * horizon
+
+
+def negAlphaBeta(b, color, alpha, beta, blanc, horizon=10, ordre=None, ply=0):
 
     if horizon == 0 or b.is_game_over():
         return estimeFin(b, color, blanc)
 
     meilleur = None
     meilleurCoup = None
-    for m in b.legal_moves():
+    moves = b.generate_moves()
+    if ordre is not None:
+        moves = ordre.trier(moves, None, ply)
+    for m in moves:
         b.push(m)
-        (nm, _) = negAlphaBeta(b, color, -beta, -alpha, not blanc, horizon - 1)
+        (nm, _) = negAlphaBeta(b, color, -beta, -alpha, not blanc, horizon - 1, ordre, ply + 1)
         nm = -nm
         if meilleur is None or nm > meilleur:
             meilleur = nm
             meilleurCoup = m
             if meilleur > alpha:
                 alpha = meilleur
-                if alpha > beta: # Coupure
+                if alpha >= beta: # Coupure
+                    if ordre is not None:
+                        ordre.coupure(m, ply, horizon)
                     b.pop()
                     return (meilleur, meilleurCoup)
         b.pop()
@@ -269,79 +355,149 @@ Code de alpha beta avec mémoire inspiré de : http://www.ffothello.org/informat
 Idée : implémenter MTDF
 '''
 
-def alphaBetaAvecMemoire(b, memoire, color, alpha, beta, blanc, horizon=10):
+# Levée quand le temps de réflexion est écoulé : la recherche en cours est abandonnée
+class TempsEcoule(Exception):
+    pass
+
 
-    hashtable_board = str(b._board)
-    if hashtable_board in memoire:
-        pos = memoire[hashtable_board]
+def alphaBetaAvecMemoire(b, memoire, color, alpha, beta, blanc, horizon=10, deadline=None, ordre=None, ply=0):
 
-        if pos[0] >= beta:
-            return pos[0]
-        if pos[1] <= alpha:
-            return pos[1]
-        alpha = max(alpha, pos[0])
-        beta = min(beta, pos[1])
+    if deadline is not None and time.perf_counter() > deadline:
+        raise TempsEcoule()
+
+    # memoire : TranspositionTable, une entrée ne sert que si elle vient d'une recherche au moins aussi profonde
+    hashtable_board = b.hash()
+    pos = memoire.probe(hashtable_board)
+    if pos is not None and pos[0] >= horizon:
+        (_, borne, score, coup) = pos
+        if borne == EXACT:
+            return (score, coup)
+        if borne == LOWER:
+            if score >= beta:
+                return (score, coup)
+            alpha = max(alpha, score)
+        else:
+            if score <= alpha:
+                return (score, coup)
+            beta = min(beta, score)
 
     if b.is_game_over() or horizon==0:
         return estimeFin(b, color, blanc)
 
+    # Comme negAlphaBeta, mais la recherche continue avec la mémoire.
+    # Coup mémorisé : le meilleur coup d'une recherche précédente (moins profonde) est essayé en premier
+    moves = b.generate_moves()
+    coupMemoire = pos[3] if pos is not None else None
+    if ordre is not None:
+        moves = ordre.trier(moves, coupMemoire, ply)
+    elif coupMemoire is not None:
+        for i in range(1, len(moves)):
+            if moves[i] == coupMemoire:
+                moves[0], moves[i] = moves[i], moves[0]
+                break
     a = alpha
     meilleurCoup = None
     meilleur = -np.inf
-    for m in b.legal_moves():
+    for m in moves:
         b.push(m)
-        (nm, _) = negAlphaBeta(b, color, -beta, -a, not blanc, horizon-1)
+        (nm, _) = alphaBetaAvecMemoire(b, memoire, color, -beta, -a, not blanc, horizon-1, deadline, ordre, ply+1)
         b.pop()
-        if nm >= meilleur:
+        nm = -nm
+        if nm > meilleur:
             meilleur = nm
             meilleurCoup = m
-            if nm >= a:
+            if nm > a:
                 a = nm
-                if nm >= beta:
+                if a >= beta: # Coupure
+                    if ordre is not None:
+                        ordre.coupure(m, ply, horizon)
                     break
 
-    # On stock les meilleurs 
-    pos = [-np.inf, np.inf]
+    # On stocke la borne obtenue, avec la profondeur et le meilleur coup
     if meilleur <= alpha:
-        pos[1] = meilleur
-    if meilleur > alpha and meilleur < beta:
-        pos = [meilleur, meilleur]
-    if meilleur >= beta:
-        pos[0] = meilleur
-    memoire[hashtable_board] = pos
+        borne = UPPER
+    elif meilleur >= beta:
+        borne = LOWER
+    else:
+        borne = EXACT
+    memoire.store(hashtable_board, horizon, borne, meilleur, meilleurCoup)
 
     return (meilleur, meilleurCoup)
 
 
-def MTDF(b, memoire, color, blanc, horizon=10, init_g = 0):
+'''
+MTD(f) : suite de recherches à fenêtre nulle (beta-1, beta), chacune donne une borne (inférieure si la
+recherche dépasse beta, supérieure sinon), jusqu'à ce que les deux bornes se rejoignent.
+Les recherches successives réutilisent les entrées de la mémoire.
+Les scores de l'heuristique sont grands (de l'ordre de 10000) : tant qu'une seule borne est connue, beta
+s'en éloigne d'un pas qui double à chaque recherche, puis on coupe l'intervalle en deux.
+'''
+def MTDF(b, memoire, color, blanc, horizon=10, init_g = 0, deadline=None, ordre=None):
     g = init_g
     upperbound = np.inf
     lowerbound = -np.inf
-    while(1):
-        if g == lowerbound:
-            beta = g+1
-        else:
-            beta = g
-        (g, meilleurCoup) = alphaBetaAvecMemoire(b, memoire, color, beta-1, beta, not blanc, horizon)
+    meilleurCoup = None
+    beta = g
+    pas = 1
+    while lowerbound < upperbound:
+        (g, coup) = alphaBetaAvecMemoire(b, memoire, color, beta-1, beta, blanc, horizon, deadline, ordre)
         if g < beta:
             upperbound = g
+            # Sans borne inférieure, on garde le coup de la dernière recherche
+            if lowerbound == -np.inf:
+                meilleurCoup = coup
         else:
             lowerbound = g
+            # Le coup qui a fait dépasser beta est sûr
+            meilleurCoup = coup
+        # Prochaine fenêtre : lowerbound < beta <= upperbound
+        if upperbound == np.inf:
+            beta = lowerbound + pas
+            pas *= 2
+        elif lowerbound == -np.inf:
+            beta = upperbound - pas + 1
+            pas *= 2
+        else:
+            beta = (lowerbound + upperbound + 1) // 2
+    return (g, meilleurCoup)
+
 
-        if upperbound == lowerbound:
+'''
+Approfondissement itératif : MTDF aux profondeurs 1, 2, ... jusqu'à horizon ou jusqu'à deadline.
+Chaque profondeur part du score de la précédente, et la mémoire lui donne la variation principale
+(le meilleur coup de chaque position est essayé en premier).
+Une profondeur interrompue par deadline est abandonnée : on garde le coup de la dernière profondeur terminée.
+La profondeur 1 va toujours jusqu'au bout, pour avoir un coup.
+'''
+def approfondissementIteratif(b, memoire, color, blanc, horizon=10, deadline=None, ordre=None):
+    g = 0
+    meilleurCoup = None
+    profondeur = 0
+    for h in range(1, horizon + 1):
+        try:
+            (g, coup) = MTDF(b, memoire, color, blanc, h, g, deadline if h > 1 else None, ordre)
+        except TempsEcoule:
             break
-        del memoire[str(b._board)]
-        print("Meilleur coup :", meilleurCoup)
-        return (None, meilleurCoup)
+        meilleurCoup = coup
+        profondeur = h
+    return (g, meilleurCoup, profondeur)
 
 
 class myPlayer(PlayerInterface):
 
 
-    def __init__(self):
+    # time_per_move: secondes de réflexion par coup, la recherche s'approfondit tant qu'il reste du temps.
+    #                None : profondeur fixe horizon
+    # horizon: profondeur de recherche sans limite de temps
+    def __init__(self, time_per_move=None, horizon=5):
         self._board = Reversi.Board(10)
+        self._time_per_move = time_per_move
+        self._horizon = horizon
+        # Coups meurtriers et historique, gardés d'un coup à l'autre (voir OrdreDesCoups)
+        self._ordre = OrdreDesCoups(self._board.get_board_size())
         self._mycolor = None
-        self._memoire = {}
+        # Table de transposition de taille fixe, gardée d'un coup à l'autre
+        self._memoire = TranspositionTable()
         self._my_ai = 'AlphaBeta with Memory'
 
     def getPlayerName(self):
@@ -355,7 +511,21 @@ class myPlayer(PlayerInterface):
 
         moves = [m for m in self._board.legal_moves()]
         #move = moves[randint(0,len(moves)-1)]
-        (_, move) = MTDF(self._board, self._memoire, self, self._blanc, 5)
+        self._memoire.new_search()
+        self._ordre.nouvelleRecherche()
+        if self._time_per_move is None:
+            deadline = None
+            horizon = self._horizon
+        else:
+            deadline = time.perf_counter() + self._time_per_move
+            # Inutile de chercher plus loin que la fin de la partie
+            (nbwhites, nbblacks) = self._board.get_nb_pieces()
+            horizon = self._board.get_board_size()**2 - nbwhites - nbblacks
+        # La recherche se fait sur une copie : un arrêt en cours de recherche laisse des coups joués dessus
+        (_, move, profondeur) = approfondissementIteratif(self._board.clone(), self._memoire, self, self._blanc,
+                                                          horizon, deadline, self._ordre)
+        print("Meilleur coup :", move, "à la profondeur", profondeur)
+        print("Transposition table :", self._memoire.get_stats())
         self._board.push(move)
         print("I am playing ", move)
         (c,x,y) = move
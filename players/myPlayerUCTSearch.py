@@ -3,41 +3,122 @@
 from utils import Reversi
 from players.playerInterface import *
 from utils.UCTSearch import *
+import multiprocessing
+import threading
 
 class myPlayer(PlayerInterface):
 
-    def __init__(self):
-        self._board = Reversi.Board(10)
+    # time_per_move: seconds of search per move. None: fixed number of iterations (see uct_search)
+    # workers: number of processes for a root parallel search (see root_parallel_uct_search).
+    #          With more than one worker, the tree is not kept between moves.
+    # leaf_playouts: number of playouts run as one batch from each new leaf (see uct_search). Without
+    #                leaf_workers they run on a BatchBoard from BATCH_MIN_PLAYOUTS playouts, one after the other below
+    # leaf_workers: number of processes for the leaf_playouts (only with one worker), None: BatchBoard
+    # transpositions: share the nodes of identical positions (see uct_search)
+    # max_nodes: maximum size of the search tree (see uct_search), None for no limit
+    # ponder: keep growing the tree in a background thread while the opponent thinks (only with one worker).
+    #         The thread shares the interpreter lock: it slows down an opponent running in the same process.
+    def __init__(self, time_per_move=None, workers=1, leaf_playouts=1, transpositions=False, max_nodes=None,
+                 ponder=False, leaf_workers=None):
+        # UCT Search only uses the public Board API: use the faster bitboard
+        self._board = Reversi.Board(10, backend='bitboard')
         self._mycolor = None
         self._memoire = {}
         self._my_ai = 'UCT Search algorithm'
+        self._time_per_move = time_per_move
+        # Search tree kept from one move to the next, rooted at the current position
+        self._root = None
+        self._workers = workers
+        self._leaf_playouts = leaf_playouts
+        self._transpositions = transpositions
+        self._max_nodes = max_nodes
+        self._pool = None
+        self._leaf_workers = leaf_workers
+        self._leaf_pool = None
+        self._ponder = ponder
+        # Background search of the current position, stopped by setting _ponder_stop
+        self._ponder_thread = None
+        self._ponder_stop = None
+        self._ponder_stats = None
 
     def getPlayerName(self):
         return "MCTS - UCT Search"
 
 
+    def _start_pondering(self):
+        if not self._ponder or self._workers > 1 or self._root is None or self._board.is_game_over():
+            return
+        self._ponder_stop = threading.Event()
+        self._ponder_stats = {}
+        # The thread searches its own copy: the referee may read self._board meanwhile
+        kwargs = dict(computational_budget=None, stats=self._ponder_stats, root=self._root,
+                      leaf_playouts=self._leaf_playouts, leaf_pool=self._leaf_pool, leaf_workers=self._leaf_workers,
+                      transpositions=self._transpositions,
+                      max_nodes=self._max_nodes, stop=self._ponder_stop)
+        self._ponder_thread = threading.Thread(target=uct_search, args=(self._board.clone(), self._mycolor),
+                                               kwargs=kwargs, daemon=True)
+        self._ponder_thread.start()
+
+    def _stop_pondering(self):
+        if self._ponder_thread is None:
+            return
+        self._ponder_stop.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+        if 'playouts' in self._ponder_stats:
+            print("UCT Search: pondered %d playouts in %.2fs" % (self._ponder_stats['playouts'], self._ponder_stats['time']))
+
     def getPlayerMove(self):
+        self._stop_pondering()
         if self._board.is_game_over():
             print("Referee told me to play but the game is over!")
             return (-1,-1)
 
         # moves = [m for m in self._board.legal_moves()]
         #move = moves[randint(0,len(moves)-1)]
-        move = uct_search(self._board, self._mycolor)
+        stats = {}
+        if self._workers > 1:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self._workers)
+            move = root_parallel_uct_search(self._board, self._mycolor, self._workers,
+                                            time_budget=self._time_per_move, stats=stats, pool=self._pool,
+                                            leaf_playouts=self._leaf_playouts, transpositions=self._transpositions,
+                                            max_nodes=self._max_nodes)
+        else:
+            if self._leaf_workers is not None and self._leaf_playouts > 1 and self._leaf_pool is None:
+                self._leaf_pool = multiprocessing.Pool(self._leaf_workers)
+            if self._root is None:
+                self._root = Node(None, self._board)
+            else:
+                print("UCT Search: reusing a tree of %d playouts" % self._root.visit_count)
+            move = uct_search(self._board, self._mycolor, time_budget=self._time_per_move, stats=stats,
+                              root=self._root, leaf_playouts=self._leaf_playouts, leaf_pool=self._leaf_pool,
+                              leaf_workers=self._leaf_workers, transpositions=self._transpositions,
+                              max_nodes=self._max_nodes)
+            print("UCT Search: tree of %d nodes (about %.1f MB)" % (stats['nodes'], stats['memory'] / 1e6))
+            self._root = advance_root(self._root, move)
+        print("UCT Search: %d playouts in %.2fs (%.0f playouts/s)" % (stats['playouts'], stats['time'], stats['playouts_per_second']))
         self._board.push(move)
         print("I am playing ", move)
         (c,x,y) = move
         assert(c==self._mycolor)
         print("My current board :")
         print(self._board)
+        self._start_pondering()
         return (x,y) 
 
     def playOpponentMove(self, x,y):
+        # The tree must not change while its root is moved
+        self._stop_pondering()
         assert(self._board.is_valid_move(self._opponent, x, y))
         print("Opponent played ", (x,y))
+        if self._root is not None:
+            self._root = advance_root(self._root, [self._opponent, x, y])
         self._board.push([self._opponent, x, y])
 
     def newGame(self, color):
+        self._stop_pondering()
+        self._root = None
         self._mycolor = color
         self._opponent = 1 if color == 2 else 2
         if self._mycolor is self._board._WHITE:
@@ -46,6 +127,13 @@ class myPlayer(PlayerInterface):
             self._blanc = False
 
     def endGame(self, winner):
+        self._stop_pondering()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self._leaf_pool is not None:
+            self._leaf_pool.close()
+            self._leaf_pool = None
         if self._mycolor == winner:
             print("I won!!!")
         else:
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+_EMPTY = 0
+_BLACK = 1
+_WHITE = 2
+
+# Same directions as Reversi.Board, each one becomes a pair of source and
+# destination slices used to shift the whole batch by one square
+_DIRECTIONS = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+
+def _slices(d, boardsize):
+    if d > 0:
+        return slice(0, boardsize - d), slice(d, boardsize)
+    if d < 0:
+        return slice(-d, boardsize), slice(0, boardsize + d)
+    return slice(0, boardsize), slice(0, boardsize)
+
+
+def _shift(a, shifts):
+    """
+        Move every square of a (N x size x size boolean array) one step in a direction
+    :param a: boolean array
+    :param shifts: (xsrc, ysrc, xdst, ydst) slices of the direction
+    :return: shifted array, squares leaving the board are dropped
+    """
+    (xsrc, ysrc, xdst, ydst) = shifts
+    out = np.zeros_like(a)
+    out[:, xdst, ydst] = a[:, xsrc, ysrc]
+    return out
+
+
+class BatchBoard:
+    """
+    N Reversi positions of the same size played in lockstep.
+    Squares are stored in a (N, boardsize, boardsize) int8 array with the
+    Reversi.Board colours (_EMPTY, _BLACK, _WHITE), so legal moves, flips,
+    random move selection and piece counts are computed for the whole batch
+    with array operations instead of Python loops.
+    """
+
+    def __init__(self, n, boardsize=8):
+        self._boardsize = boardsize
+        self._board = np.zeros((n, boardsize, boardsize), dtype=np.int8)
+        _middle = boardsize // 2
+        self._board[:, _middle-1, _middle-1] = _BLACK
+        self._board[:, _middle-1, _middle] = _WHITE
+        self._board[:, _middle, _middle-1] = _WHITE
+        self._board[:, _middle, _middle] = _BLACK
+        self._nextPlayer = np.full(n, _BLACK, dtype=np.int8)
+        self._successivePass = np.zeros(n, dtype=np.int32)
+        self._shifts = []
+        for xdirection, ydirection in _DIRECTIONS:
+            (xsrc, xdst) = _slices(xdirection, boardsize)
+            (ysrc, ydst) = _slices(ydirection, boardsize)
+            self._shifts.append((xsrc, ysrc, xdst, ydst))
+
+    @classmethod
+    def from_boards(cls, boards):
+        """
+            Build a batch from Reversi.Board objects (any backend, same size)
+        :param boards: list of boards
+        :return: a BatchBoard holding a copy of each position
+        """
+        batch = cls(len(boards), boards[0].get_board_size())
+        for i, b in enumerate(boards):
+            batch._board[i] = b._board
+            batch._nextPlayer[i] = b._nextPlayer
+            batch._successivePass[i] = b._successivePass
+        return batch
+
+    @classmethod
+    def repeat(cls, board, n):
+        """
+            Build a batch holding n copies of the same position
+        :param board: a Reversi.Board
+        :param n: batch size
+        :return: a BatchBoard
+        """
+        batch = cls(n, board.get_board_size())
+        batch._board[:] = board._board
+        batch._nextPlayer[:] = board._nextPlayer
+        batch._successivePass[:] = board._successivePass
+        return batch
+
+    def __len__(self):
+        return self._board.shape[0]
+
+    def get_board_size(self):
+        return self._boardsize
+
+    def get_nb_pieces(self):
+        """
+        :return: (whites, blacks) arrays of piece counts, one entry per board
+        """
+        whites = np.count_nonzero(self._board == _WHITE, axis=(1, 2))
+        blacks = np.count_nonzero(self._board == _BLACK, axis=(1, 2))
+        return whites, blacks
+
+    def _colours(self, player):
+        """
+        :param player: array of colours, one per board
+        :return: (own, opp, empty) boolean arrays
+        """
+        player = player[:, None, None]
+        own = self._board == player
+        opp = self._board == (_BLACK + _WHITE - player)
+        empty = self._board == _EMPTY
+        return own, opp, empty
+
+    def legal_moves_mask(self, player=None):
+        """
+            Legal moves of every board
+        :param player: array of colours (default: side to move of each board)
+        :return: (N, size, size) boolean array, True where the move is legal
+        """
+        if player is None:
+            player = self._nextPlayer
+        own, opp, empty = self._colours(player)
+        moves = np.zeros_like(own)
+        for shifts in self._shifts:
+            t = _shift(own, shifts) & opp
+            while t.any():
+                t = _shift(t, shifts)
+                moves |= t & empty
+                t &= opp
+        return moves
+
+    def is_game_over(self):
+        """
+        :return: boolean array, True for boards where neither side can play
+        """
+        blacks = np.full(len(self), _BLACK, dtype=np.int8)
+        whites = np.full(len(self), _WHITE, dtype=np.int8)
+        black_moves = self.legal_moves_mask(blacks).any(axis=(1, 2))
+        white_moves = self.legal_moves_mask(whites).any(axis=(1, 2))
+        return ~(black_moves | white_moves)
+
+    def push(self, xs, ys):
+        """
+            Play one move on every board for its side to move, (-1, -1) is a pass.
+            Moves are assumed to be legal (see legal_moves_mask).
+        :param xs: array of x coordinates
+        :param ys: array of y coordinates
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        passing = xs < 0
+        playing = np.nonzero(~passing)[0]
+        own, opp, _ = self._colours(self._nextPlayer)
+        played = np.zeros_like(own)
+        played[playing, xs[playing], ys[playing]] = True
+        flips = np.zeros_like(own)
+        for shifts in self._shifts:
+            line = np.zeros_like(own)
+            t = _shift(played, shifts) & opp
+            while t.any():
+                line |= t
+                t = _shift(t, shifts) & opp
+            # The run of opponent discs is flipped only if one of our discs closes it
+            closed = (_shift(line, shifts) & own).any(axis=(1, 2))
+            flips |= line & closed[:, None, None]
+        changed = played | flips
+        self._board = np.where(changed, self._nextPlayer[:, None, None], self._board).astype(np.int8)
+        self._successivePass = np.where(passing, self._successivePass + 1, 0).astype(np.int32)
+        self._nextPlayer = (_BLACK + _WHITE - self._nextPlayer).astype(np.int8)
+
+    def random_moves(self, rng=None, mask=None):
+        """
+            Choose uniformly one legal move per board
+        :param rng: numpy Generator (default: a new one)
+        :param mask: legal moves mask, if already known
+        :return: (xs, ys) arrays, (-1, -1) for boards that have to pass
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        if mask is None:
+            mask = self.legal_moves_mask()
+        n = len(self)
+        flat = mask.reshape(n, -1)
+        # Random priorities on legal squares only, the highest one is played
+        choice = np.argmax(np.where(flat, rng.random(flat.shape), -1.0), axis=1)
+        can_play = flat.any(axis=1)
+        xs = np.where(can_play, choice // self._boardsize, -1)
+        ys = np.where(can_play, choice % self._boardsize, -1)
+        return xs, ys
+
+    def playout(self, rng=None):
+        """
+            Play random moves on every board until all the games are over
+        :param rng: numpy Generator (default: a new one)
+        :return: (whites, blacks) final piece counts
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        # Two successive passes: neither side can play any more
+        while (self._successivePass < 2).any():
+            xs, ys = self.random_moves(rng)
+            over = self._successivePass >= 2
+            xs[over] = -1
+            ys[over] = -1
+            self.push(xs, ys)
+        return self.get_nb_pieces()
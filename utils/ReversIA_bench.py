@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+'''
+Benchmark and cross-check of the move generator of utils.Reversi.Board.
+
+Run from the repository root :
+
+    python -m utils.ReversIA_bench
+    python -m utils.ReversIA_bench --sizes 8 --depths 1,3,5,7 --backends list,bitboard
+
+For each board size and backend, it reports nodes per second for
+legal_moves(), push()/pop(), is_game_over() and perft at several depths.
+Every backend must give the same legal moves and perft counts as the first
+one : any difference is reported and the script exits with status 1.
+'''
+
+import argparse
+import random
+import sys
+import time
+
+from utils import Reversi
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(description="ReversIA move generator benchmark")
+    parser.add_argument("--sizes", type=str, default='8,10',
+                        help="board sizes, comma separated")
+    parser.add_argument("--depths", type=str, default='2,4,6',
+                        help="perft depths, comma separated")
+    parser.add_argument("--backends", type=str, default=','.join(Reversi._BACKENDS),
+                        help="Board backends, comma separated (the first one is the reference)")
+    parser.add_argument("--positions", type=int, default=200,
+                        help="number of random positions for the per-call benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def random_positions(boardsize, n, seed):
+    '''
+    :return: n positions (to_bytes encoding) taken along random games
+    '''
+    rng = random.Random(seed)
+    positions = []
+    b = Reversi.Board(boardsize)
+    while len(positions) < n:
+        if b.is_game_over():
+            b = Reversi.Board(boardsize)
+        positions.append(b.to_bytes())
+        b.push(rng.choice(b.legal_moves()))
+    return positions
+
+
+def timed(f, boards):
+    '''
+    :return: (number of nodes, elapsed seconds) of f called on each board
+    '''
+    nodes = 0
+    start = time.perf_counter()
+    for b in boards:
+        nodes += f(b)
+    return nodes, time.perf_counter() - start
+
+
+def count_legal_moves(b):
+    b.legal_moves()
+    return 1
+
+
+def count_game_over(b):
+    b.is_game_over()
+    return 1
+
+
+def count_push_pop(b):
+    moves = b.legal_moves()
+    for m in moves:
+        b.push(m)
+        b.pop()
+    return len(moves)
+
+
+def bench(boardsize, backend, positions, depths):
+    '''
+    :return: (list of (name, nodes, seconds), legal moves of each position, perft counts)
+    '''
+    results = []
+    # A new board per call : the legal moves caches start empty, as in a search
+    boards = [Reversi.Board.from_bytes(p, backend=backend) for p in positions]
+    results.append(("legal_moves",) + timed(count_legal_moves, boards))
+    boards = [Reversi.Board.from_bytes(p, backend=backend) for p in positions]
+    results.append(("is_game_over",) + timed(count_game_over, boards))
+    boards = [Reversi.Board.from_bytes(p, backend=backend) for p in positions]
+    results.append(("push/pop",) + timed(count_push_pop, boards))
+    moves = [[list(m) for m in b.legal_moves()] for b in boards]
+
+    counts = []
+    for depth in depths:
+        b = Reversi.Board(boardsize, backend=backend)
+        start = time.perf_counter()
+        count = b.perft(depth)
+        results.append(("perft(" + str(depth) + ")", count, time.perf_counter() - start))
+        counts.append(count)
+    return results, moves, counts
+
+
+def main():
+    args = get_arguments()
+    sizes = [int(s) for s in args.sizes.split(',')]
+    depths = [int(d) for d in args.depths.split(',')]
+    backends = args.backends.split(',')
+    ok = True
+    for boardsize in sizes:
+        positions = random_positions(boardsize, args.positions, args.seed)
+        print("Board " + str(boardsize) + "x" + str(boardsize) + ", " + str(len(positions)) + " positions")
+        reference = None
+        for backend in backends:
+            results, moves, counts = bench(boardsize, backend, positions, depths)
+            for (name, nodes, seconds) in results:
+                print("  %-10s %-14s %10d nodes %12.0f nodes/s" % (backend, name, nodes, nodes / max(seconds, 1e-9)))
+            if reference is None:
+                reference = (backend, moves, counts)
+                continue
+            if moves != reference[1]:
+                ok = False
+                print("  MISMATCH: legal moves of " + backend + " differ from " + reference[0])
+            if counts != reference[2]:
+                ok = False
+                print("  MISMATCH: perft " + str(counts) + " for " + backend + ", " + str(reference[2]) + " for " + reference[0])
+    if not ok:
+        sys.exit(1)
+    print("All backends agree")
+
+
+if __name__ == '__main__':
+    main()
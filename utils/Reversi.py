@@ -6,13 +6,107 @@
 
     '''
 
+import random
+
+_DIRECTIONS = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+# Pour chaque taille de plateau et chaque case (x,y) :
+#   rays[x][y]       : les rayons partant de (x,y) dans les huit directions,
+#                      chacun étant la suite des cases (x',y') rencontrées.
+#                      Les rayons de moins de deux cases, qui ne peuvent rien
+#                      retourner, sont omis.
+#   neighbours[x][y] : les cases voisines de (x,y) sur le plateau.
+# Les tables sont calculées une fois par taille et partagées par tous les
+# plateaux de cette taille.
+_RAYS = {}
+
+def _ray_tables(boardsize):
+    tables = _RAYS.get(boardsize)
+    if tables is None:
+        rays = []
+        neighbours = []
+        for x in range(boardsize):
+            raysLine = []
+            neighboursLine = []
+            for y in range(boardsize):
+                raysSquare = []
+                neighboursSquare = []
+                for xdirection, ydirection in _DIRECTIONS:
+                    ray = []
+                    xr, yr = x + xdirection, y + ydirection
+                    while 0 <= xr < boardsize and 0 <= yr < boardsize:
+                        ray.append((xr, yr))
+                        xr += xdirection
+                        yr += ydirection
+                    if len(ray) > 0:
+                        neighboursSquare.append(ray[0])
+                    if len(ray) > 1:
+                        raysSquare.append(tuple(ray))
+                raysLine.append(tuple(raysSquare))
+                neighboursLine.append(tuple(neighboursSquare))
+            rays.append(raysLine)
+            neighbours.append(neighboursLine)
+        tables = (rays, neighbours)
+        _RAYS[boardsize] = tables
+    return tables
+
+# Clés de Zobrist (64 bits), une table par taille de plateau. Le tirage est
+# fait avec une graine fixe : la même position a la même clé dans tous les
+# processus et d'une partie à l'autre.
+_ZOBRIST = {}
+
+def _zobrist_tables(boardsize):
+    tables = _ZOBRIST.get(boardsize)
+    if tables is None:
+        rng = random.Random(boardsize)
+        nbSquares = boardsize * boardsize
+        black = [rng.getrandbits(64) for _ in range(nbSquares)]
+        white = [rng.getrandbits(64) for _ in range(nbSquares)]
+        # squares[player][x * boardsize + y], flip[i] : changement de couleur en i
+        squares = (None, black, white)
+        flip = [black[i] ^ white[i] for i in range(nbSquares)]
+        sideToMove = rng.getrandbits(64)
+        size = rng.getrandbits(64)
+        tables = (squares, flip, sideToMove, size)
+        _ZOBRIST[boardsize] = tables
+    return tables
+
+class Move(list):
+    ''' Coup [player, x, y] renvoyé par Board.generate_moves. Il s'utilise
+        comme la liste habituelle, mais garde aussi les pions qu'il
+        retourne (flips) et la clé de la position pour laquelle il a été
+        généré (key) : push le joue alors sans refaire la recherche des
+        pions à retourner. Le format de flips dépend de la représentation
+        du plateau (backend, la classe du plateau qui a généré le coup).
+    '''
+    __slots__ = ('flips', 'key', 'backend')
+
+    def __init__(self, player, x, y, flips, key, backend):
+        list.__init__(self, (player, x, y))
+        self.flips = flips
+        self.key = key
+        self.backend = backend
+
+
 class Board:
     _BLACK = 1
     _WHITE = 2
     _EMPTY = 0
 
+    # Le paramètre backend permet de choisir la représentation du plateau
+    # (voir _BACKENDS en bas du fichier). Par défaut : liste de listes.
+    def __new__(cls, boardsize = 8, backend = None):
+        if backend is not None:
+            if backend not in _BACKENDS:
+                raise ValueError("Unknown board backend: " + str(backend))
+            # Sinon Python n'appellerait pas __init__ sur l'objet renvoyé
+            if not issubclass(_BACKENDS[backend], cls):
+                raise ValueError("Backend " + str(backend) + " is not a " + cls.__name__)
+            cls = _BACKENDS[backend]
+        return object.__new__(cls)
+
     # Attention, la taille du plateau est donnée en paramètre
-    def __init__(self, boardsize = 8):
+    def __init__(self, boardsize = 8, backend = None):
       self._nbWHITE = 2
       self._nbBLACK = 2
       self._nextPlayer = self._BLACK
@@ -28,10 +122,112 @@ class Board:
       
       self._stack= []
       self._successivePass = 0
+      (self._rays, self._neighbours) = _ray_tables(self._boardsize)
+
+      # Frontière : cases vides voisines d'au moins un pion. Seules ces cases
+      # peuvent être des coups légaux. Elle est mise à jour par push/pop.
+      self._buildFrontier()
+      # Coups légaux de chaque joueur (indexé par la couleur), calculés à la
+      # demande puis conservés jusqu'au prochain push. Le pop les restaure.
+      self._legalCache = [None, None, None]
+      self._zobrist = _zobrist_tables(self._boardsize)
+      self._hash = self._computeHash()
 
     def reset(self):
         self.__init__()
 
+    # Copie de la position, beaucoup moins coûteuse que copy.deepcopy.
+    # Par défaut l'historique (_stack) n'est pas copié : la copie ne peut
+    # pas revenir avant la position courante, mais son coût ne dépend plus
+    # de l'avancement de la partie.
+    def clone(self, keep_history = False):
+        other = object.__new__(type(self))
+        other._nbWHITE = self._nbWHITE
+        other._nbBLACK = self._nbBLACK
+        other._nextPlayer = self._nextPlayer
+        other._boardsize = self._boardsize
+        other._board = [list(l) for l in self._board]
+        other._rays = self._rays
+        other._neighbours = self._neighbours
+        # Les entrées de la pile ne sont jamais modifiées : une copie de
+        # surface suffit
+        other._stack = list(self._stack) if keep_history else []
+        other._successivePass = self._successivePass
+        other._frontier = set(self._frontier)
+        other._legalCache = list(self._legalCache)
+        other._zobrist = self._zobrist
+        other._hash = self._hash
+        return other
+
+    # Encodage compact de la position (l'historique n'est pas conservé) :
+    #   octet 0 : taille du plateau, octet 1 : joueur qui a le trait,
+    #   octet 2 : nombre de passes successifs,
+    #   puis 2 bits par case (0 vide, 1 noir, 2 blanc) : la case
+    #   i = x * boardsize + y occupe les bits 2*(i%4) de l'octet 3 + i//4.
+    # Sert de clé canonique (identique pour toutes les représentations) et
+    # pour échanger des positions entre processus.
+    def to_bytes(self):
+        n = self._boardsize
+        data = bytearray(3 + (n * n + 3) // 4)
+        data[0] = n
+        data[1] = self._nextPlayer
+        data[2] = min(self._successivePass, 255)
+        i = 0
+        for line in self._board:
+            for c in line:
+                if c != self._EMPTY:
+                    data[3 + (i >> 2)] |= c << ((i & 3) << 1)
+                i += 1
+        return bytes(data)
+
+    # Inverse de to_bytes. data peut être un bytes, bytearray ou memoryview :
+    # il est lu en place, sans copie. backend comme pour le constructeur.
+    @classmethod
+    def from_bytes(cls, data, backend = None):
+        view = memoryview(data)
+        n = view[0] if len(view) > 0 else 0
+        if n == 0 or len(view) != 3 + (n * n + 3) // 4 or view[1] not in (cls._BLACK, cls._WHITE):
+            raise ValueError("Invalid board encoding")
+        board = cls(n, backend = backend)
+        squares = [(view[3 + (i >> 2)] >> ((i & 3) << 1)) & 3 for i in range(n * n)]
+        # Le code 3 n'est pas une couleur (et serait le bord de MailboxBoard)
+        if 3 in squares:
+            raise ValueError("Invalid board encoding")
+        board._load(squares, view[1], view[2])
+        return board
+
+    # Remplace la position par squares (couleur de chaque case, dans l'ordre
+    # x * boardsize + y) et vide l'historique
+    def _load(self, squares, nextPlayer, successivePass):
+        n = self._boardsize
+        self._board = [list(squares[x * n:(x + 1) * n]) for x in range(n)]
+        self._nbBLACK = squares.count(self._BLACK)
+        self._nbWHITE = squares.count(self._WHITE)
+        self._nextPlayer = nextPlayer
+        self._successivePass = successivePass
+        self._stack = []
+        self._buildFrontier()
+        self._legalCache = [None, None, None]
+        self._hash = self._computeHash()
+
+    # Clé de Zobrist (entier 64 bits) de la position, trait compris.
+    # Mise à jour incrémentalement par push/pop : à utiliser comme clé
+    # de table de transposition.
+    def hash(self):
+        return self._hash
+
+    # Calcul complet de la clé, à partir de la grille de pions
+    def _computeHash(self):
+        (squares, _, sideToMove, h) = self._zobrist
+        board = self._board
+        for x in range(self._boardsize):
+            for y in range(self._boardsize):
+                if board[x][y] != self._EMPTY:
+                    h ^= squares[board[x][y]][x * self._boardsize + y]
+        if self._nextPlayer == self._WHITE:
+            h ^= sideToMove
+        return h
+
     # Donne la taille du plateau 
     def get_board_size(self):
         return self._boardsize
@@ -55,78 +251,99 @@ class Board:
     # Sinon renvoie False
     # Ce code est très fortement inspiré de https://inventwithpython.com/chapter15.html
     # y faire référence dans tous les cas
+    # Les rayons partant de (xstart, ystart) sont lus dans self._rays (voir
+    # _ray_tables) : plus de test de bord pendant le parcours.
     def testAndBuild_ValidMove(self, player, xstart, ystart):
-        if self._board[xstart][ystart] != self._EMPTY or not self._isOnBoard(xstart, ystart):
+        if not self._isOnBoard(xstart, ystart) or self._board[xstart][ystart] != self._EMPTY:
             return False
-    
-        self._board[xstart][ystart] = player # On pourra remettre _EMPTY ensuite 
-    
+
+        board = self._board
         otherPlayer = self._flip(player)
-    
+
         tilesToFlip = [] # Si au moins un coup est valide, on collecte ici toutes les pieces a retourner
-        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-            x, y = xstart, ystart
-            x += xdirection 
-            y += ydirection
-            if self._isOnBoard(x, y) and self._board[x][y] == otherPlayer:
-                # There is a piece belonging to the other player next to our piece.
-                x += xdirection
-                y += ydirection
-                if not self._isOnBoard(x, y):
-                    continue
-                while self._board[x][y] == otherPlayer:
-                    x += xdirection
-                    y += ydirection
-                    if not self._isOnBoard(x, y): # break out of while loop, then continue in for loop
-                        break
-                if not self._isOnBoard(x, y):
-                    continue
-                if self._board[x][y] == player: # We are sure we can at least build this move. Let's collect
-                    while True:
-                        x -= xdirection
-                        y -= ydirection
-                        if x == xstart and y == ystart:
-                            break
-                        tilesToFlip.append([x, y])
-    
-        self._board[xstart][ystart] = self._EMPTY # restore the empty space
+        for ray in self._rays[xstart][ystart]:
+            x, y = ray[0]
+            if board[x][y] != otherPlayer:
+                continue
+            # There is a piece belonging to the other player next to our piece.
+            for i in range(1, len(ray)):
+                x, y = ray[i]
+                if board[x][y] != otherPlayer:
+                    if board[x][y] == player: # We are sure we can at least build this move. Let's collect
+                        tilesToFlip.extend(ray[:i])
+                    break
+
         if len(tilesToFlip) == 0: # If no tiles were flipped, this is not a valid move.
             return False
         return tilesToFlip
 
     # Pareil que ci-dessus mais ne revoie que vrai / faux (permet de tester plus rapidement)
     def lazyTest_ValidMove(self, player, xstart, ystart):
-        if self._board[xstart][ystart] != self._EMPTY or not self._isOnBoard(xstart, ystart):
+        if not self._isOnBoard(xstart, ystart) or self._board[xstart][ystart] != self._EMPTY:
             return False
-    
-        self._board[xstart][ystart] = player # On pourra remettre _EMPTY ensuite 
-    
+
+        board = self._board
         otherPlayer = self._flip(player)
-    
-        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-            x, y = xstart, ystart
-            x += xdirection 
-            y += ydirection
-            if self._isOnBoard(x, y) and self._board[x][y] == otherPlayer:
-                # There is a piece belonging to the other player next to our piece.
-                x += xdirection
-                y += ydirection
-                if not self._isOnBoard(x, y):
-                    continue
-                while self._board[x][y] == otherPlayer:
-                    x += xdirection
-                    y += ydirection
-                    if not self._isOnBoard(x, y): # break out of while loop, then continue in for loop
-                        break
-                if not self._isOnBoard(x, y): # On a au moins 
-                    continue
-                if self._board[x][y] == player: # We are sure we can at least build this move. 
-                    self._board[xstart][ystart] = self._EMPTY
-                    return True
-                 
-        self._board[xstart][ystart] = self._EMPTY # restore the empty space
+
+        for ray in self._rays[xstart][ystart]:
+            x, y = ray[0]
+            if board[x][y] != otherPlayer:
+                continue
+            for i in range(1, len(ray)):
+                x, y = ray[i]
+                if board[x][y] != otherPlayer:
+                    if board[x][y] == player: # We are sure we can at least build this move.
+                        return True
+                    break
+
         return False
 
+    def _buildFrontier(self):
+        self._frontier = set()
+        for x in range(self._boardsize):
+            for y in range(self._boardsize):
+                if self._board[x][y] != self._EMPTY:
+                    self._addToFrontier(x, y)
+
+    # Ajoute à la frontière les cases vides voisines de (x,y)
+    # et renvoie celles qui n'y étaient pas encore
+    def _addToFrontier(self, x, y):
+        added = []
+        for (xn, yn) in self._neighbours[x][y]:
+            if self._board[xn][yn] == self._EMPTY and (xn, yn) not in self._frontier:
+                self._frontier.add((xn, yn))
+                added.append((xn, yn))
+        return added
+
+    # Coups légaux (sans le passe) de player, dans l'ordre de parcours du plateau.
+    # Le cache garde des tuples : legal_moves renvoie des listes neuves, qu'on peut modifier
+    def _legalMoves(self, player):
+        moves = self._legalCache[player]
+        if moves is None:
+            moves = [(player, x, y) for (x, y) in sorted(self._frontier) if self.lazyTest_ValidMove(player, x, y)]
+            self._legalCache[player] = moves
+        return moves
+
+    # Comme legal_moves, mais renvoie des Move qui portent déjà leurs pions
+    # à retourner : à utiliser quand on va jouer (presque) tous les coups
+    def generate_moves(self):
+        player = self._nextPlayer
+        cached = self._legalCache[player]
+        if cached is not None:
+            squares = [(m[1], m[2]) for m in cached]
+        else:
+            squares = sorted(self._frontier)
+        moves = []
+        for (x, y) in squares:
+            toflip = self.testAndBuild_ValidMove(player, x, y)
+            if toflip:
+                moves.append(Move(player, x, y, toflip, self._hash, type(self)))
+        if cached is None:
+            self._legalCache[player] = [(player, m[1], m[2]) for m in moves]
+        if len(moves) == 0:
+            return [[player, -1, -1]] # We shall pass
+        return moves
+
     def _flip(self, player):
         if player == self._BLACK:
             return self._WHITE 
@@ -144,15 +361,28 @@ class Board:
         assert player == self._nextPlayer
         if x==-1 and y==-1: # pass
             self._nextPlayer = self._flip(player)
-            self._stack.append([move, self._successivePass, []])
+            # La position ne change pas : les coups légaux restent valables
+            self._stack.append([move, self._successivePass, [], [], self._legalCache, self._hash])
             self._successivePass += 1
+            self._hash ^= self._zobrist[2]
             return
-        toflip = self.testAndBuild_ValidMove(player,x,y)
-        self._stack.append([move, self._successivePass, toflip])
-        self._successivePass = 0
+        if type(move) is Move and move.key == self._hash and move.backend is type(self):
+            toflip = move.flips
+        else:
+            toflip = self.testAndBuild_ValidMove(player,x,y)
         self._board[x][y] = player
         for xf,yf in toflip:
             self._board[xf][yf] = self._flip(self._board[xf][yf])
+        self._frontier.discard((x, y))
+        added = self._addToFrontier(x, y)
+        self._stack.append([move, self._successivePass, toflip, added, self._legalCache, self._hash])
+        self._successivePass = 0
+        self._legalCache = [None, None, None]
+        (squares, flip, sideToMove, _) = self._zobrist
+        h = self._hash ^ sideToMove ^ squares[player][x * self._boardsize + y]
+        for xf,yf in toflip:
+            h ^= flip[xf * self._boardsize + yf]
+        self._hash = h
         if player == self._BLACK:
             self._nbBLACK += 1 + len(toflip)
             self._nbWHITE -= len(toflip)
@@ -163,13 +393,16 @@ class Board:
             self._nextPlayer = self._BLACK
 
     def pop(self):
-        [move, self._successivePass, toflip] = self._stack.pop()
+        [move, self._successivePass, toflip, added, self._legalCache, self._hash] = self._stack.pop()
         [player,x,y] = move
         self._nextPlayer = player 
         if len(toflip) == 0: # pass
             assert x == -1 and y == -1
             return
         self._board[x][y] = self._EMPTY
+        for square in added:
+            self._frontier.remove(square)
+        self._frontier.add((x, y))
         for xf,yf in toflip:
             self._board[xf][yf] = self._flip(self._board[xf][yf])
         if player == self._BLACK:
@@ -180,35 +413,35 @@ class Board:
             self._nbBLACK += len(toflip)
 
     # Est-ce que on peut au moins jouer un coup ?
-    # Note: cette info pourrait être codée plus efficacement
+    # Les coups légaux ne sont cherchés que sur la frontière, et une seule
+    # fois par position (voir _legalMoves)
     def at_least_one_legal_move(self, player):
-        for x in range(0,self._boardsize):
-            for y in range(0,self._boardsize):
-                if self.lazyTest_ValidMove(player, x, y):
-                   return True
-        return False
+        return len(self._legalMoves(player)) > 0
 
     # Renvoi la liste des coups possibles
-    # Note: cette méthode pourrait être codée plus efficacement
     def legal_moves(self):
-        moves = []
-        for x in range(0,self._boardsize):
-            for y in range(0,self._boardsize):
-                if self.lazyTest_ValidMove(self._nextPlayer, x, y):
-                    moves.append([self._nextPlayer,x,y])
-        if len(moves) is 0:
+        moves = [list(m) for m in self._legalMoves(self._nextPlayer)]
+        if len(moves) == 0:
             moves = [[self._nextPlayer, -1, -1]] # We shall pass
         return moves
 
 
     def count_legal_moves(self, player):
-        count = 0
-        for x in range(0,self._boardsize):
-            for y in range(0,self._boardsize):
-                if self.lazyTest_ValidMove(player, x, y):
-                    count += 1
-        return count
+        return len(self._legalMoves(player))
+
 
+    # Nombre de positions atteintes en depth demi-coups (perft). Un passe
+    # compte comme un coup ; une partie terminée avant depth compte pour une
+    # position. Sert à vérifier et à chronométrer le générateur de coups.
+    def perft(self, depth):
+        if depth == 0 or self.is_game_over():
+            return 1
+        nodes = 0
+        for m in self.generate_moves():
+            self.push(m)
+            nodes += self.perft(depth - 1)
+            self.pop()
+        return nodes
 
     def count_corner(self, player) :
         count = 0
@@ -240,6 +473,580 @@ class Board:
     __repr__ = __str__
 
 
+def _popcount(b):
+    return bin(b).count("1")
+
+# Les tables de décalage ne dépendent que de la taille : on les calcule une
+# seule fois par taille et on les partage entre tous les plateaux.
+_BITBOARD_TABLES = {}
+
+def _bitboard_tables(boardsize):
+    tables = _BITBOARD_TABLES.get(boardsize)
+    if tables is None:
+        full = (1 << (boardsize * boardsize)) - 1
+        notFirstCol = full
+        notLastCol = full
+        for x in range(boardsize):
+            notFirstCol &= ~(1 << (x * boardsize))
+            notLastCol &= ~(1 << (x * boardsize + boardsize - 1))
+        dirs = []
+        for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+            # Un décalage vers la droite (y+1) ne doit pas faire revenir un
+            # pion sur la première colonne de la ligne suivante, et inversement.
+            if ydirection == 1:
+                mask = notFirstCol
+            elif ydirection == -1:
+                mask = notLastCol
+            else:
+                mask = full
+            dirs.append((xdirection * boardsize + ydirection, mask))
+        tables = (full, tuple(dirs))
+        _BITBOARD_TABLES[boardsize] = tables
+    return tables
+
+
+class BitBoard(Board):
+    ''' Même plateau (et même interface) que Board, mais la position est
+        stockée dans deux entiers Python, un bit par case : la case (x,y)
+        est le bit x * boardsize + y. Les coups légaux et les pions à
+        retourner sont calculés par décalages et masques, sans parcourir
+        les cases une à une.
+    '''
+
+    def __init__(self, boardsize = 8, backend = None):
+        self._nbWHITE = 2
+        self._nbBLACK = 2
+        self._nextPlayer = self._BLACK
+        self._boardsize = boardsize
+        self._full, self._dirs = _bitboard_tables(boardsize)
+        _middle = int(self._boardsize / 2)
+        self._black = self._bit(_middle-1, _middle-1) | self._bit(_middle, _middle)
+        self._white = self._bit(_middle-1, _middle) | self._bit(_middle, _middle-1)
+
+        self._stack= []
+        self._successivePass = 0
+        # Masque des coups légaux de chaque joueur, comme Board._legalCache
+        self._legalCache = [None, None, None]
+        self._zobrist = _zobrist_tables(self._boardsize)
+        self._hash = self._computeHash()
+
+    def reset(self):
+        self.__init__(self._boardsize)
+
+    def clone(self, keep_history = False):
+        other = object.__new__(BitBoard)
+        other._nbWHITE = self._nbWHITE
+        other._nbBLACK = self._nbBLACK
+        other._nextPlayer = self._nextPlayer
+        other._boardsize = self._boardsize
+        other._full = self._full
+        other._dirs = self._dirs
+        other._black = self._black
+        other._white = self._white
+        other._stack = list(self._stack) if keep_history else []
+        other._successivePass = self._successivePass
+        other._legalCache = list(self._legalCache)
+        other._zobrist = self._zobrist
+        other._hash = self._hash
+        return other
+
+    def _bit(self, x, y):
+        return 1 << (x * self._boardsize + y)
+
+    def to_bytes(self):
+        n = self._boardsize
+        data = bytearray(3 + (n * n + 3) // 4)
+        data[0] = n
+        data[1] = self._nextPlayer
+        data[2] = min(self._successivePass, 255)
+        for (discs, c) in ((self._black, self._BLACK), (self._white, self._WHITE)):
+            while discs:
+                low = discs & -discs
+                i = low.bit_length() - 1
+                data[3 + (i >> 2)] |= c << ((i & 3) << 1)
+                discs ^= low
+        return bytes(data)
+
+    def _load(self, squares, nextPlayer, successivePass):
+        self._black = 0
+        self._white = 0
+        for i, c in enumerate(squares):
+            if c == self._BLACK:
+                self._black |= 1 << i
+            elif c == self._WHITE:
+                self._white |= 1 << i
+        self._nbBLACK = _popcount(self._black)
+        self._nbWHITE = _popcount(self._white)
+        self._nextPlayer = nextPlayer
+        self._successivePass = successivePass
+        self._stack = []
+        self._legalCache = [None, None, None]
+        self._hash = self._computeHash()
+
+    # Vue liste de listes du plateau, pour le code qui lit directement
+    # _board (heuristiques, affichage). Elle est reconstruite à chaque appel.
+    @property
+    def _board(self):
+        board = []
+        for x in range(self._boardsize):
+            line = []
+            for y in range(self._boardsize):
+                bit = self._bit(x, y)
+                if self._black & bit:
+                    line.append(self._BLACK)
+                elif self._white & bit:
+                    line.append(self._WHITE)
+                else:
+                    line.append(self._EMPTY)
+            board.append(line)
+        return board
+
+    def _discs(self, player):
+        if player == self._BLACK:
+            return self._black, self._white
+        return self._white, self._black
+
+    # Masque des coups légaux pour le joueur possédant own
+    def _movesMask(self, own, opp):
+        empty = self._full & ~(own | opp)
+        moves = 0
+        for shift, mask in self._dirs:
+            if shift > 0:
+                t = (own << shift) & mask & opp
+                while t:
+                    t = (t << shift) & mask
+                    moves |= t & empty
+                    t &= opp
+            else:
+                t = (own >> -shift) & mask & opp
+                while t:
+                    t = (t >> -shift) & mask
+                    moves |= t & empty
+                    t &= opp
+        return moves
+
+    # Masque des coups légaux de player, calculé une fois par position (voir _legalCache)
+    def _legalMask(self, player):
+        moves = self._legalCache[player]
+        if moves is None:
+            (own, opp) = self._discs(player)
+            moves = self._movesMask(own, opp)
+            self._legalCache[player] = moves
+        return moves
+
+    # Masque des pions retournés si on pose le pion move (un seul bit)
+    def _flipsMask(self, move, own, opp):
+        flips = 0
+        for shift, mask in self._dirs:
+            line = 0
+            if shift > 0:
+                t = (move << shift) & mask
+                while t & opp:
+                    line |= t
+                    t = (t << shift) & mask
+            else:
+                t = (move >> -shift) & mask
+                while t & opp:
+                    line |= t
+                    t = (t >> -shift) & mask
+            if t & own:
+                flips |= line
+        return flips
+
+    def _maskToList(self, mask):
+        squares = []
+        while mask:
+            low = mask & -mask
+            squares.append(list(divmod(low.bit_length() - 1, self._boardsize)))
+            mask ^= low
+        return squares
+
+    def testAndBuild_ValidMove(self, player, xstart, ystart):
+        if not self._isOnBoard(xstart, ystart):
+            return False
+        move = self._bit(xstart, ystart)
+        if (self._black | self._white) & move:
+            return False
+        (own, opp) = self._discs(player)
+        flips = self._flipsMask(move, own, opp)
+        if flips == 0:
+            return False
+        return self._maskToList(flips)
+
+    def lazyTest_ValidMove(self, player, xstart, ystart):
+        if not self._isOnBoard(xstart, ystart):
+            return False
+        return self._legalMask(player) & self._bit(xstart, ystart) != 0
+
+    def push(self, move):
+        [player, x, y] = move
+        assert player == self._nextPlayer
+        if x==-1 and y==-1: # pass
+            self._nextPlayer = self._flip(player)
+            self._stack.append([move, self._successivePass, 0, self._legalCache, self._hash])
+            self._successivePass += 1
+            self._hash ^= self._zobrist[2]
+            return
+        bit = self._bit(x, y)
+        if type(move) is Move and move.key == self._hash and move.backend is type(self):
+            flips = move.flips
+        else:
+            (own, opp) = self._discs(player)
+            assert (own | opp) & bit == 0
+            flips = self._flipsMask(bit, own, opp)
+            assert flips != 0
+        self._stack.append([move, self._successivePass, flips, self._legalCache, self._hash])
+        self._successivePass = 0
+        self._legalCache = [None, None, None]
+        (squares, flip, sideToMove, _) = self._zobrist
+        h = self._hash ^ sideToMove ^ squares[player][x * self._boardsize + y]
+        rest = flips
+        while rest:
+            low = rest & -rest
+            h ^= flip[low.bit_length() - 1]
+            rest ^= low
+        self._hash = h
+        nbflips = _popcount(flips)
+        if player == self._BLACK:
+            self._black |= bit | flips
+            self._white ^= flips
+            self._nbBLACK += 1 + nbflips
+            self._nbWHITE -= nbflips
+            self._nextPlayer = self._WHITE
+        else:
+            self._white |= bit | flips
+            self._black ^= flips
+            self._nbWHITE += 1 + nbflips
+            self._nbBLACK -= nbflips
+            self._nextPlayer = self._BLACK
+
+    def pop(self):
+        [move, self._successivePass, flips, self._legalCache, self._hash] = self._stack.pop()
+        [player,x,y] = move
+        self._nextPlayer = player
+        if x == -1 and y == -1: # pass
+            return
+        bit = self._bit(x, y)
+        nbflips = _popcount(flips)
+        if player == self._BLACK:
+            self._black &= ~(bit | flips)
+            self._white |= flips
+            self._nbBLACK -= 1 + nbflips
+            self._nbWHITE += nbflips
+        else:
+            self._white &= ~(bit | flips)
+            self._black |= flips
+            self._nbWHITE -= 1 + nbflips
+            self._nbBLACK += nbflips
+
+    def at_least_one_legal_move(self, player):
+        return self._legalMask(player) != 0
+
+    def legal_moves(self):
+        moves = [[self._nextPlayer, x, y] for x, y in self._maskToList(self._legalMask(self._nextPlayer))]
+        if len(moves) == 0:
+            moves = [[self._nextPlayer, -1, -1]] # We shall pass
+        return moves
+
+    # Les Move renvoyés portent le masque des pions à retourner
+    def generate_moves(self):
+        player = self._nextPlayer
+        (own, opp) = self._discs(player)
+        moves = []
+        mask = self._legalMask(player)
+        while mask:
+            low = mask & -mask
+            (x, y) = divmod(low.bit_length() - 1, self._boardsize)
+            moves.append(Move(player, x, y, self._flipsMask(low, own, opp), self._hash, type(self)))
+            mask ^= low
+        if len(moves) == 0:
+            moves = [[player, -1, -1]] # We shall pass
+        return moves
+
+    def count_legal_moves(self, player):
+        return _popcount(self._legalMask(player))
+
+    def count_corner(self, player):
+        (own, _) = self._discs(player)
+        n = self._boardsize
+        corners = self._bit(0, 0) | self._bit(0, n-1) | self._bit(n-1, 0) | self._bit(n-1, n-1)
+        return _popcount(own & corners)
+
 
+# Plateau "mailbox" : tableau à une dimension entouré d'une bordure.
+# Avec width = boardsize + 1, la case (x,y) est à l'indice
+# (x+1) * width + y + 1 ; la colonne 0 de chaque ligne sert de bord droit à
+# la ligne précédente et de bord gauche à la suivante. Tables par taille :
+#   width, offsets : largeur et déplacements dans les huit directions
+#   index[i]       : indice de la case i = x * boardsize + y
+#   square[p]      : numéro de case de l'indice p (-1 sur la bordure)
+#   empty          : tableau vide (bordure comprise) à copier
+_BORDER = 3
+_MAILBOX_TABLES = {}
+
+def _mailbox_tables(boardsize):
+    tables = _MAILBOX_TABLES.get(boardsize)
+    if tables is None:
+        width = boardsize + 1
+        offsets = tuple(xdirection * width + ydirection for xdirection, ydirection in _DIRECTIONS)
+        index = [(x + 1) * width + y + 1 for x in range(boardsize) for y in range(boardsize)]
+        square = [-1] * ((boardsize + 2) * width + 1)
+        empty = bytearray([_BORDER]) * len(square)
+        for i, p in enumerate(index):
+            square[p] = i
+            empty[p] = Board._EMPTY
+        tables = (width, offsets, index, square, bytes(empty))
+        _MAILBOX_TABLES[boardsize] = tables
+    return tables
+
+
+class MailboxBoard(Board):
+    """ Même plateau (et même interface) que Board, pour les grandes tailles
+        (12x12 à 20x20 et plus). Les cases sont dans un bytearray entouré
+        d'une bordure (_BORDER) : un rayon s'arrête tout seul sur le bord,
+        sans appel à _isOnBoard ni double indexation. La frontière et les
+        coups légaux sont maintenus comme dans Board, mais sur les indices
+        du tableau.
+    """
+
+    def __init__(self, boardsize = 8, backend = None):
+        self._nbWHITE = 2
+        self._nbBLACK = 2
+        self._nextPlayer = self._BLACK
+        self._boardsize = boardsize
+        (self._width, self._offsets, self._index, self._square, empty) = _mailbox_tables(boardsize)
+        self._squares = bytearray(empty)
+        _middle = int(self._boardsize / 2)
+        self._squares[self._pos(_middle-1, _middle-1)] = self._BLACK
+        self._squares[self._pos(_middle-1, _middle)] = self._WHITE
+        self._squares[self._pos(_middle, _middle-1)] = self._WHITE
+        self._squares[self._pos(_middle, _middle)] = self._BLACK
+
+        self._stack= []
+        self._successivePass = 0
+        self._buildFrontier()
+        self._legalCache = [None, None, None]
+        self._zobrist = _zobrist_tables(self._boardsize)
+        self._hash = self._computeHash()
+
+    def reset(self):
+        self.__init__(self._boardsize)
+
+    def _pos(self, x, y):
+        return (x + 1) * self._width + y + 1
+
+    # Vue liste de listes du plateau, reconstruite à chaque appel
+    @property
+    def _board(self):
+        n = self._boardsize
+        squares = self._squares
+        return [list(squares[self._pos(x, 0):self._pos(x, 0) + n]) for x in range(n)]
+
+    def clone(self, keep_history = False):
+        other = object.__new__(MailboxBoard)
+        other._nbWHITE = self._nbWHITE
+        other._nbBLACK = self._nbBLACK
+        other._nextPlayer = self._nextPlayer
+        other._boardsize = self._boardsize
+        other._width = self._width
+        other._offsets = self._offsets
+        other._index = self._index
+        other._square = self._square
+        other._squares = bytearray(self._squares)
+        other._stack = list(self._stack) if keep_history else []
+        other._successivePass = self._successivePass
+        other._frontier = set(self._frontier)
+        other._legalCache = list(self._legalCache)
+        other._zobrist = self._zobrist
+        other._hash = self._hash
+        return other
+
+    def to_bytes(self):
+        n = self._boardsize
+        data = bytearray(3 + (n * n + 3) // 4)
+        data[0] = n
+        data[1] = self._nextPlayer
+        data[2] = min(self._successivePass, 255)
+        squares = self._squares
+        for i, p in enumerate(self._index):
+            if squares[p] != self._EMPTY:
+                data[3 + (i >> 2)] |= squares[p] << ((i & 3) << 1)
+        return bytes(data)
+
+    def _load(self, squares, nextPlayer, successivePass):
+        self._squares = bytearray(_mailbox_tables(self._boardsize)[4])
+        for i, p in enumerate(self._index):
+            self._squares[p] = squares[i]
+        self._nbBLACK = squares.count(self._BLACK)
+        self._nbWHITE = squares.count(self._WHITE)
+        self._nextPlayer = nextPlayer
+        self._successivePass = successivePass
+        self._stack = []
+        self._buildFrontier()
+        self._legalCache = [None, None, None]
+        self._hash = self._computeHash()
+
+    def _buildFrontier(self):
+        self._frontier = set()
+        for p in self._index:
+            if self._squares[p] != self._EMPTY:
+                self._addToFrontier(p)
+
+    # La bordure n'est pas vide : pas besoin de tester le bord
+    def _addToFrontier(self, p):
+        added = []
+        squares = self._squares
+        for d in self._offsets:
+            q = p + d
+            if squares[q] == self._EMPTY and q not in self._frontier:
+                self._frontier.add(q)
+                added.append(q)
+        return added
+
+    # Indices des pions retournés si player joue en p (liste vide si illégal)
+    def _flipsAt(self, player, p):
+        squares = self._squares
+        otherPlayer = self._flip(player)
+        flips = []
+        for d in self._offsets:
+            q = p + d
+            if squares[q] != otherPlayer:
+                continue
+            q += d
+            while squares[q] == otherPlayer:
+                q += d
+            if squares[q] == player:
+                q -= d
+                while q != p:
+                    flips.append(q)
+                    q -= d
+        return flips
+
+    def _isLegalAt(self, player, p):
+        squares = self._squares
+        otherPlayer = self._flip(player)
+        for d in self._offsets:
+            q = p + d
+            if squares[q] != otherPlayer:
+                continue
+            q += d
+            while squares[q] == otherPlayer:
+                q += d
+            if squares[q] == player:
+                return True
+        return False
+
+    def testAndBuild_ValidMove(self, player, xstart, ystart):
+        if not self._isOnBoard(xstart, ystart):
+            return False
+        p = self._pos(xstart, ystart)
+        if self._squares[p] != self._EMPTY:
+            return False
+        flips = self._flipsAt(player, p)
+        if len(flips) == 0:
+            return False
+        return [divmod(self._square[q], self._boardsize) for q in flips]
+
+    def lazyTest_ValidMove(self, player, xstart, ystart):
+        if not self._isOnBoard(xstart, ystart):
+            return False
+        p = self._pos(xstart, ystart)
+        return self._squares[p] == self._EMPTY and self._isLegalAt(player, p)
+
+    # Les indices croissants suivent l'ordre de parcours (x, puis y)
+    def _legalMoves(self, player):
+        moves = self._legalCache[player]
+        if moves is None:
+            n = self._boardsize
+            moves = [(player, i // n, i % n) for i in [self._square[p] for p in sorted(self._frontier) if self._isLegalAt(player, p)]]
+            self._legalCache[player] = moves
+        return moves
+
+    # Les Move renvoyés portent les indices des pions à retourner
+    def generate_moves(self):
+        player = self._nextPlayer
+        moves = []
+        for m in self._legalMoves(player):
+            flips = self._flipsAt(player, self._pos(m[1], m[2]))
+            moves.append(Move(player, m[1], m[2], flips, self._hash, type(self)))
+        if len(moves) == 0:
+            return [[player, -1, -1]] # We shall pass
+        return moves
+
+    def push(self, move):
+        [player, x, y] = move
+        assert player == self._nextPlayer
+        if x==-1 and y==-1: # pass
+            self._nextPlayer = self._flip(player)
+            self._stack.append([move, self._successivePass, [], [], self._legalCache, self._hash])
+            self._successivePass += 1
+            self._hash ^= self._zobrist[2]
+            return
+        p = self._pos(x, y)
+        if type(move) is Move and move.key == self._hash and move.backend is type(self):
+            toflip = move.flips
+        else:
+            assert self._isOnBoard(x, y) and self._squares[p] == self._EMPTY
+            toflip = self._flipsAt(player, p)
+            assert len(toflip) > 0
+        squares = self._squares
+        squares[p] = player
+        for q in toflip:
+            squares[q] = player
+        self._frontier.discard(p)
+        added = self._addToFrontier(p)
+        self._stack.append([move, self._successivePass, toflip, added, self._legalCache, self._hash])
+        self._successivePass = 0
+        self._legalCache = [None, None, None]
+        (zsquares, flip, sideToMove, _) = self._zobrist
+        square = self._square
+        h = self._hash ^ sideToMove ^ zsquares[player][square[p]]
+        for q in toflip:
+            h ^= flip[square[q]]
+        self._hash = h
+        if player == self._BLACK:
+            self._nbBLACK += 1 + len(toflip)
+            self._nbWHITE -= len(toflip)
+            self._nextPlayer = self._WHITE
+        else:
+            self._nbWHITE += 1 + len(toflip)
+            self._nbBLACK -= len(toflip)
+            self._nextPlayer = self._BLACK
+
+    def pop(self):
+        [move, self._successivePass, toflip, added, self._legalCache, self._hash] = self._stack.pop()
+        [player,x,y] = move
+        self._nextPlayer = player
+        if x == -1 and y == -1: # pass
+            return
+        p = self._pos(x, y)
+        squares = self._squares
+        otherPlayer = self._flip(player)
+        squares[p] = self._EMPTY
+        for q in toflip:
+            squares[q] = otherPlayer
+        for q in added:
+            self._frontier.remove(q)
+        self._frontier.add(p)
+        if player == self._BLACK:
+            self._nbBLACK -= 1 + len(toflip)
+            self._nbWHITE += len(toflip)
+        else:
+            self._nbWHITE -= 1 + len(toflip)
+            self._nbBLACK += len(toflip)
+
+    def count_corner(self, player):
+        n = self._boardsize
+        count = 0
+        for (x, y) in [(0, 0), (0, n-1), (n-1, 0), (n-1, n-1)]:
+            if self._squares[self._pos(x, y)] == player:
+                count += 1
+        return count
 
 
+# Représentations disponibles pour Board(boardsize, backend=...)
+_BACKENDS = {
+    'list': Board,
+    'bitboard': BitBoard,
+    'mailbox': MailboxBoard,
+}
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# Bound types of a stored score
+EXACT = 0
+LOWER = 1   # the search failed high: score is a lower bound
+UPPER = 2   # the search failed low: score is an upper bound
+
+
+class TranspositionTable:
+    """
+    Fixed-capacity transposition table for alpha-beta searches, keyed by Board.hash().
+    Each bucket holds two entries (two-tier replacement):
+      - slot 0 is depth-preferred: it is only replaced by a search at least as deep,
+        or by any search once its entry comes from an older search (see new_search)
+      - slot 1 is always replaced, it keeps what slot 0 refused or evicted
+    An entry is (depth, bound type, score, best move). Entries are stored in flat lists,
+    so memory does not grow during a game.
+    """
+
+    def __init__(self, buckets=2**16):
+        """
+        :param buckets: number of buckets, rounded up to a power of two (2 entries each)
+        """
+        size = 1
+        while size < buckets:
+            size *= 2
+        self._mask = size - 1
+        n = 2 * size
+        self._keys = [None] * n
+        self._depths = [0] * n
+        self._bounds = [EXACT] * n
+        self._scores = [0] * n
+        self._moves = [None] * n
+        self._generations = [0] * n
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def __len__(self):
+        """
+        :return: number of stored entries (see get_stats for the capacity)
+        """
+        return sum(1 for k in self._keys if k is not None)
+
+    def new_search(self):
+        """
+            Start a new search (a new move): entries of the previous searches can be replaced
+            by shallower ones
+        """
+        self._generation += 1
+
+    def clear(self):
+        for i in range(len(self._keys)):
+            self._keys[i] = None
+        self._generation = 0
+
+    def probe(self, key):
+        """
+        :param key: board hash
+        :return: (depth, bound type, score, best move) of the position, None if it is not stored
+        """
+        i = (key & self._mask) << 1
+        keys = self._keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                self.misses += 1
+                # The bucket is used by other positions
+                if keys[i - 1] is not None:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return (self._depths[i], self._bounds[i], self._scores[i], self._moves[i])
+
+    def store(self, key, depth, bound, score, move):
+        """
+            Store the result of a search, if the replacement scheme keeps it
+        :param key: board hash
+        :param depth: remaining depth of the search
+        :param bound: EXACT, LOWER or UPPER
+        :param score: score found
+        :param move: best move found (None if unknown)
+        """
+        i = (key & self._mask) << 1
+        keys = self._keys
+        if keys[i] == key or keys[i] is None or depth >= self._depths[i] \
+                or self._generations[i] != self._generation:
+            if keys[i] is not None and keys[i] != key:
+                # The evicted entry moves to the always-replace slot
+                self._write(i + 1, keys[i], self._depths[i], self._bounds[i], self._scores[i], self._moves[i],
+                            self._generations[i])
+            elif keys[i + 1] == key:
+                keys[i + 1] = None
+            self._write(i, key, depth, bound, score, move, self._generation)
+        else:
+            self._write(i + 1, key, depth, bound, score, move, self._generation)
+        self.stores += 1
+
+    def _write(self, i, key, depth, bound, score, move, generation):
+        self._keys[i] = key
+        self._depths[i] = depth
+        self._bounds[i] = bound
+        self._scores[i] = score
+        self._moves[i] = move
+        self._generations[i] = generation
+
+    def get_stats(self):
+        """
+        :return: dict of the counters and of the number of used entries
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'collisions': self.collisions, 'stores': self.stores,
+                'used': len(self), 'capacity': len(self._keys)}
@@ -1,125 +1,485 @@
 import numpy as np
-import copy
+import multiprocessing
+import random
+import time
+from utils.BatchBoard import BatchBoard
 
 CP = 1/np.sqrt(2)
 
 _BLACK = 1
 _WHITE = 2
 
+# Random generator of the search: much cheaper per call than np.random
+_rng = random.Random()
+# Random generator of the batched rollouts (see leaf_policy)
+_np_rng = np.random.default_rng()
+
+# Below this many playouts, a BatchBoard is slower than sequential playouts
+# (8x8 and 10x10 bitboards: the batch only wins from about 128 playouts)
+BATCH_MIN_PLAYOUTS = 128
+
+# Approximate memory of a node with its move lists and statistics, in bytes
+# (measured with tracemalloc on 8x8 and 10x10 searches: 1.3 to 1.4 kB)
+NODE_BYTES = 1400
+
 '''
 UCT search based from : 
 https://www.labri.fr/perso/lsimon/ia-2019/App-Alphago/MCTS-survey.pdf
 page 6-7-8-9
 '''
+class Statistics:
+    """
+    Visit counts and total rewards of all the nodes of a tree, stored as a struct of arrays:
+    node i owns visits[i] and rewards[i], so the UCB1 scores of all the children of a node
+    are computed with a few array operations (see best_child_index).
+    With transpositions, table maps the hash of each position of the tree to its node (see expand):
+    it is kept with the tree between searches.
+    """
+    __slots__ = ('visits', 'rewards', 'size', 'table')
+
+    def __init__(self, capacity=1024):
+        """
+        :param capacity: initial number of nodes, the arrays grow as needed
+        """
+        # Rewards are sums of piece differences: integers, as the visit counts
+        self.visits = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.table = None
+
+    def add(self):
+        """
+            Reserve the slot of a new node
+        :return: its index
+        """
+        if self.size == len(self.visits):
+            # Doubled: amortised O(1) per node
+            self.visits = np.concatenate((self.visits, np.zeros(self.size, dtype=np.int64)))
+            self.rewards = np.concatenate((self.rewards, np.zeros(self.size, dtype=np.int64)))
+        self.size += 1
+        return self.size - 1
+
+
 class Node:
+    # Many nodes are created per search: no per-instance __dict__.
+    # A node does not keep its board: the search replays the actions from the
+    # root on a single scratch board (see tree_policy).
+    # actions[i] is the move leading to children[i], child_indices[i] is its slot in stats.
+    # With transpositions (see uct_search) a node can be the child of several nodes, through
+    # different moves: it then has no parent (so that a node kept by
+    # advance_root does not keep the rest of the previous tree alive) and
+    # incoming_action is the move it was created by.
+    __slots__ = ('incoming_action', 'key', 'stats', 'index', 'parent', 'children', 'actions', 'child_indices',
+                 'untried_actions', 'terminal')
 
-    def __init__(self, parent, board):
-        self.incoming_action = None
-        self.total_sim_reward = 0
-        self.visit_count = 0
+    def __init__(self, parent, board, incoming_action=None, stats=None):
+        """
+        :param parent: parent node (None for the root)
+        :param board: board in the position of this node, only read here
+        :param incoming_action: move leading from parent to this node
+        :param stats: Statistics of the tree (default: the parent's ones, or new ones for a root)
+        """
+        if stats is None:
+            stats = parent.stats if parent is not None else Statistics()
+        self.incoming_action = incoming_action
+        # Hash of the position, to find the node again in the transposition table
+        self.key = board.hash()
+        self.stats = stats
+        self.index = stats.add()
         self.parent = parent
-        self.board = board
         self.children = []
+        self.actions = []
+        self.child_indices = np.zeros(0, dtype=np.intp)
+        # Computed once: the legal moves not expanded yet, and whether the game is over
+        self.terminal = board.is_game_over()
+        self.untried_actions = [] if self.terminal else board.legal_moves()
+
+    @property
+    def visit_count(self):
+        return int(self.stats.visits[self.index])
+
+    @property
+    def total_sim_reward(self):
+        return int(self.stats.rewards[self.index])
 
     def choose_untried_action(self):
         """
         Choose randomly a move among legal moves, not in childrens
-        :return: a new board with the new move
+        :return: the move, removed from the untried moves
         """
-        children_moves = [c.incoming_action for c in self.children]## NEW
-        legal_moves = []
-        for l_m in self.board.legal_moves():
-            if l_m not in children_moves:
-                legal_moves.append(l_m)
-        random_move = np.random.randint(0, len(legal_moves))
-        move = legal_moves[random_move]
-        new_board = copy.deepcopy(self.board)
-        new_board.push(move)
-        return new_board, move
-
-def tree_policy(v):
+        untried = self.untried_actions
+        random_move = int(_rng.random() * len(untried))
+        move = untried[random_move]
+        # Remove it in O(1): the order of untried moves does not matter
+        untried[random_move] = untried[-1]
+        untried.pop()
+        return move
+
+def tree_policy(v, board, path, table=None, max_nodes=None):
     """
         Get tree policy
     :param v: a node
+    :param board: board in the position of v, the moves down to the returned node are pushed on it
+    :param path: list of the nodes of the descent, the nodes below v are appended to it
+    :param table: transposition table (see expand)
+    :param max_nodes: if the tree has this many nodes, it is not expanded any more
     :return: a node
     """
-    while not v.board.is_game_over():
-        if len(v.children) == 0 or len(v.children)<len(v.board.legal_moves()):## NEW
-            return expand(v)
+    while not v.terminal:
+        if len(v.untried_actions) > 0 and (max_nodes is None or v.stats.size < max_nodes):
+            v = expand(v, board, table)
+            path.append(v)
+            return v
+        elif len(v.children) == 0:
+            # Tree full: the playout starts from this leaf
+            return v
         else:
-            v = best_child(v, CP)
+            i = best_child_index(v, CP)
+            board.push(v.actions[i])
+            v = v.children[i]
+            path.append(v)
     return v
 
 
-def expand(v):
+def expand(v, board, table=None):
     """
         Chose an action among all possible action and return un new node
     :param v: a node
+    :param board: board in the position of v, the chosen action is pushed on it
+    :param table: if given, dict board.hash() -> node: a position already in the tree is not
+                  created again, its node becomes a child of v too
     :return: the new node
     """
-    # False : use the state associated to know node (incoming action variable)
-    new_board, action = v.choose_untried_action()
-    vp = Node(v, new_board)
-    # print('New node', vp)
+    action = v.choose_untried_action()
+    board.push(action)
+    vp = None
+    if table is not None:
+        key = board.hash()
+        vp = table.get(key)
+    if vp is None:
+        vp = Node(v if table is None else None, board, action, v.stats)
+        if table is not None:
+            table[key] = vp
     # Add new node to v
-    vp.incoming_action = action
     v.children.append(vp)
+    v.actions.append(action)
+    v.child_indices = np.append(v.child_indices, vp.index)
     return vp
 
 
+def best_child_index(v, c=CP):
+    """
+        Return the index of the best child, the UCB1 scores of all the children are computed at once
+    :param v: node
+    :param c: exploitation parameter = 1/sqrt(2)
+    :return: index in v.children and v.actions
+    """
+    stats = v.stats
+    visits = stats.visits[v.child_indices]
+    scores = stats.rewards[v.child_indices] / visits
+    if c != 0:
+        scores += c * np.sqrt(2 * np.log(stats.visits[v.index]) / visits)
+    # argmax keeps the first of equal scores
+    return int(np.argmax(scores))
+
+
 def best_child(v, c=CP):
     """
-        Return the move associate to the best child
+        Return the best child
     :param v: node
     :param c: exploitation parameter = 1/sqrt(2)
-    :return: best move
-    """
-    max_score = -np.inf
-    best_node = None
-    for vp in v.children:
-        score = (vp.total_sim_reward/vp.visit_count)+c*np.sqrt((2*np.log(v.visit_count))/vp.visit_count)
-        if score > max_score:
-            max_score = score
-            best_node = vp
-            #print("Best score : ", max_score)
-    return best_node
+    :return: best child node
+    """
+    return v.children[best_child_index(v, c)]
 
 def default_policy(s, color):
     """
-    :param s: a state
+        Random playout until the end of the game, on a scratch copy of s that is then discarded
+        (cheaper than popping every move back)
+    :param s: a state, it is not modified
+    :param color: color of the player the reward is computed for
     :return: reward for state s
     """
-    # Use all the possible state
-    s_copy = copy.deepcopy(s)
-    while not s_copy.is_game_over():
+    s_copy = s.clone()
+    random_value = _rng.random
+    while True:
         legal_moves = s_copy.legal_moves()
-        random_move = np.random.randint(0, len(legal_moves))
-        move = legal_moves[random_move]
-        s_copy.push(move)
-    s_copy.pop()
-    score = s_copy.get_nb_pieces()[0] - s_copy.get_nb_pieces()[1]
+        # legal_moves() is a pass only when the player cannot play: the game may be over
+        if legal_moves[0][1] == -1 and s_copy.is_game_over():
+            break
+        s_copy.push(legal_moves[int(random_value() * len(legal_moves))])
+    (whites, blacks) = s_copy.get_nb_pieces()
+    score = whites - blacks
+    return -score if color == _BLACK else score
+
+
+def _leaf_rollouts(args):
+    """
+        Worker of leaf_policy: sequential playouts from the same position
+    :param args: (board class, board.to_bytes(), color, number of playouts, seed)
+    :return: sum of the rewards
+    """
+    (board_class, data, color, k, seed) = args
+    _rng.seed(seed)
+    board = board_class.from_bytes(data)
+    return sum(default_policy(board, color) for _ in range(k))
+
+
+def leaf_policy(s, color, k, pool=None, workers=None):
+    """
+        k random playouts from the same state, run as one batch
+    :param s: a state, it is not modified
+    :param color: color of the player the reward is computed for
+    :param k: number of playouts
+    :param pool: if given, the playouts are split between the processes of this multiprocessing pool,
+                 else they are played in lockstep on a BatchBoard, or one after the other if k is smaller
+                 than BATCH_MIN_PLAYOUTS
+    :param workers: number of processes of pool, the playouts are split in as many tasks
+                    (default: number of CPU cores)
+    :return: sum of the k rewards
+    """
+    if pool is not None:
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        data = s.to_bytes()
+        seed = _rng.randrange(2**31)
+        tasks = [(type(s), data, color, k // workers + (1 if i < k % workers else 0), seed + i)
+                 for i in range(min(k, workers))]
+        return sum(pool.map(_leaf_rollouts, tasks))
+    if k < BATCH_MIN_PLAYOUTS:
+        return sum(default_policy(s, color) for _ in range(k))
+    whites, blacks = BatchBoard.repeat(s, k).playout(_np_rng)
+    score = int(np.sum(whites) - np.sum(blacks))
     return -score if color == _BLACK else score
 
 
-def backup(v, delta):
+def backup(v, delta, n=1, path=None):
     """
         Backpropagation function
     :param v: a node
-    :param delta:
-    :return: parent of node v
+    :param delta: sum of the rewards of the playouts
+    :param n: number of playouts delta comes from
+    :param path: if given, the nodes to update (the descent that reached v), instead of v and its
+                 parents: needed when nodes are shared between several parents
     """
+    stats = v.stats
+    if path is not None:
+        # A node appears once in a descent: one vectorised update for the whole path
+        indices = [u.index for u in path]
+        stats.visits[indices] += n
+        stats.rewards[indices] += delta
+        return
     while v is not None:
-        v.visit_count += 1
-        v.total_sim_reward = v.total_sim_reward + delta
+        stats.visits[v.index] += n
+        stats.rewards[v.index] += delta
         v = v.parent
 
-def uct_search(board, color=_WHITE, computational_budget = 100):
-    v0 = Node(None, board)
-    while computational_budget > 0:
-        vl = tree_policy(v0)
-        delta = default_policy(vl.board, color)
-        backup(vl, delta)
-        #vtemp = vl
-        computational_budget -= 1
+def advance_root(root, move):
+    """
+        Keep the subtree of a move that has been played, to reuse it in the next search
+    :param root: root node of a previous search
+    :param move: move played from the root position
+    :return: the child node of move, detached from the rest of the tree (None if it was never expanded)
+    """
+    for i, child in enumerate(root.children):
+        if root.actions[i] == move:
+            child.parent = None
+            _compact(child)
+            return child
+    return None
+
+
+def _reachable(root):
+    """
+    :param root: a node
+    :return: list of the nodes of its subtree (each node once, even when it has several parents)
+    """
+    nodes = []
+    seen = set()
+    stack = [root]
+    while stack:
+        v = stack.pop()
+        if id(v) in seen:
+            continue
+        seen.add(id(v))
+        nodes.append(v)
+        stack.extend(v.children)
+    return nodes
+
+
+def _compact(root):
+    """
+        Move the statistics of the nodes reachable from root to new arrays, so that the slots of
+        the discarded part of the tree are freed. The transposition table, if any, keeps these nodes only.
+    :param root: a node, with its subtree
+    """
+    nodes = _reachable(root)
+    old = root.stats
+    stats = Statistics(max(len(nodes), 1024))
+    indices = [v.index for v in nodes]
+    stats.visits[:len(nodes)] = old.visits[indices]
+    stats.rewards[:len(nodes)] = old.rewards[indices]
+    stats.size = len(nodes)
+    for i, v in enumerate(nodes):
+        v.stats = stats
+        v.index = i
+    for v in nodes:
+        v.child_indices = np.array([vp.index for vp in v.children], dtype=np.intp)
+    if old.table is not None:
+        stats.table = {v.key: v for v in nodes}
+
+
+def uct_search(board, color=_WHITE, computational_budget = 100, time_budget=None, check_every=4, stats=None,
+               root=None, leaf_playouts=1, leaf_pool=None, transpositions=False, max_nodes=None, max_bytes=None,
+               stop=None, leaf_workers=None):
+    """
+        Main loop of the search
+    :param board: current board, it is not modified
+    :param color: color of the player to find a move for
+    :param computational_budget: number of iterations, when there is no time budget (None: no limit, the
+                                 search then ends with stop)
+    :param time_budget: if given, search until this many seconds have passed instead (anytime mode)
+    :param check_every: in anytime mode, number of iterations between two reads of the clock
+    :param stats: if a dict is given, it is filled with 'iterations', 'playouts', 'time', 'playouts_per_second',
+                  'nodes' (size of the tree) and 'memory' (its approximate size in bytes, see NODE_BYTES)
+    :param root: node of board's position kept from a previous search (see advance_root), grown in place.
+                 The previous searches must have used the same color.
+    :param leaf_playouts: number of playouts from each new leaf, run as one batch (see leaf_policy)
+    :param leaf_pool: multiprocessing pool for the batched playouts (default: vectorised on a BatchBoard from
+                      BATCH_MIN_PLAYOUTS playouts, sequential below)
+    :param leaf_workers: number of processes of leaf_pool (default: number of CPU cores)
+    :param transpositions: share the nodes of identical positions reached by different move orders
+                           (the tree becomes a DAG, statistics are pooled per position)
+    :param max_nodes: maximum number of nodes of the tree: once reached, the search goes on without
+                      expanding it, the playouts start from its leaves
+    :param max_bytes: maximum approximate memory of the tree, same as max_nodes = max_bytes // NODE_BYTES
+    :raise ValueError: if the limits allow less than 2 nodes
+    :param stop: threading.Event, the search ends as soon as it is set (read between two iterations), used
+                 to search in a background thread (pondering)
+    :return: the best move found
+    """
+    start = time.perf_counter()
+    deadline = None if time_budget is None else start + time_budget
+    # The whole tree shares this board: moves are pushed on the way down and popped after backup
+    scratch = board.clone()
+    v0 = root if root is not None else Node(None, scratch)
+    table = None
+    if transpositions:
+        # Kept from the previous searches of this tree (see advance_root), else built from its nodes
+        table = v0.stats.table
+        if table is None:
+            table = {v.key: v for v in _reachable(v0)}
+            v0.stats.table = table
+    if max_bytes is not None:
+        max_nodes = max_bytes // NODE_BYTES if max_nodes is None else min(max_nodes, max_bytes // NODE_BYTES)
+    # The root needs at least one child to choose a move
+    if max_nodes is not None and max_nodes < 2:
+        raise ValueError("The tree must be allowed at least 2 nodes (max_nodes >= 2, max_bytes >= 2 * NODE_BYTES)")
+    iterations = 0
+    while True:
+        path = [v0]
+        tree_policy(v0, scratch, path, table, max_nodes)
+        if leaf_playouts > 1:
+            delta = leaf_policy(scratch, color, leaf_playouts, leaf_pool, leaf_workers)
+        else:
+            delta = default_policy(scratch, color)
+        backup(path[-1], delta, leaf_playouts, path)
+        for _ in range(len(path) - 1):
+            scratch.pop()
+        iterations += 1
+        if stop is not None and stop.is_set():
+            break
+        if deadline is None:
+            if computational_budget is not None and iterations >= computational_budget:
+                break
+        elif iterations == 1 or iterations % check_every == 0:
+            # Stop if the next check_every iterations would probably overrun the deadline
+            now = time.perf_counter()
+            if now + (now - start) / iterations * check_every >= deadline:
+                break
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats['iterations'] = iterations
+        stats['playouts'] = iterations * leaf_playouts
+        stats['time'] = elapsed
+        stats['playouts_per_second'] = stats['playouts'] / elapsed if elapsed > 0 else 0
+        stats['nodes'] = v0.stats.size
+        stats['memory'] = v0.stats.size * NODE_BYTES
     # print(v0.children)
-    return best_child(v0, 0).incoming_action
\ No newline at end of file
+    return v0.actions[best_child_index(v0, 0)]
+
+
+def _root_search(args):
+    """
+        Worker of root_parallel_uct_search: an independent search from the same position
+    :param args: (board class, board.to_bytes(), color, computational_budget, time_budget, leaf_playouts,
+                  transpositions, max_nodes, seed)
+    :return: (number of iterations, number of playouts, [(move, visit_count, total_sim_reward) for each root child])
+    """
+    global _np_rng
+    (board_class, data, color, computational_budget, time_budget, leaf_playouts, transpositions, max_nodes,
+     seed) = args
+    _rng.seed(seed)
+    _np_rng = np.random.default_rng(seed)
+    board = board_class.from_bytes(data)
+    root = Node(None, board)
+    stats = {}
+    uct_search(board, color, computational_budget, time_budget=time_budget, stats=stats, root=root,
+               leaf_playouts=leaf_playouts, transpositions=transpositions, max_nodes=max_nodes)
+    return stats['iterations'], stats['playouts'], [(list(a), c.visit_count, c.total_sim_reward) for a, c in zip(root.actions, root.children)]
+
+
+def root_parallel_uct_search(board, color=_WHITE, workers=None, computational_budget=100, time_budget=None,
+                             seed=None, stats=None, pool=None, leaf_playouts=1, transpositions=False,
+                             max_nodes=None):
+    """
+        Root parallelisation: independent searches of the same position in worker processes,
+        the root children statistics are summed before choosing the move.
+    :param board: current board, it is not modified
+    :param color: color of the player to find a move for
+    :param workers: number of searches (default: number of CPU cores)
+    :param computational_budget: iterations of each search, when there is no time budget
+    :param time_budget: if given, each search runs for this many seconds instead
+    :param seed: base seed, search i uses seed + i (default: a random one)
+    :param stats: if a dict is given, it is filled with 'iterations', 'playouts', 'time' and 'playouts_per_second'
+    :param pool: multiprocessing pool to use (default: a new one for this call)
+    :param leaf_playouts: number of playouts from each new leaf in each search (see uct_search)
+    :param transpositions: share identical positions in each search (see uct_search)
+    :param max_nodes: maximum number of nodes of each search tree (see uct_search)
+    :return: the move with the best mean reward over all the searches
+    """
+    start = time.perf_counter()
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if seed is None:
+        seed = random.randrange(2**31)
+    data = board.to_bytes()
+    tasks = [(type(board), data, color, computational_budget, time_budget, leaf_playouts, transpositions, max_nodes,
+              seed + i) for i in range(workers)]
+    if pool is None:
+        with multiprocessing.Pool(workers) as p:
+            results = p.map(_root_search, tasks)
+    else:
+        results = pool.map(_root_search, tasks)
+
+    visits = {}
+    rewards = {}
+    moves = {}
+    iterations = 0
+    playouts = 0
+    for (n, p, children) in results:
+        iterations += n
+        playouts += p
+        for (move, visit_count, total_sim_reward) in children:
+            key = tuple(move)
+            moves[key] = move
+            visits[key] = visits.get(key, 0) + visit_count
+            rewards[key] = rewards.get(key, 0) + total_sim_reward
+    best = max(visits, key=lambda k: rewards[k] / visits[k])
+    if stats is not None:
+        elapsed = time.perf_counter() - start
+        stats['iterations'] = iterations
+        stats['playouts'] = playouts
+        stats['time'] = elapsed
+        stats['playouts_per_second'] = playouts / elapsed if elapsed > 0 else 0
+    return moves[best]